@@ -0,0 +1,50 @@
+"""
+Moves completed and soft deleted tasks out of the hot tasks table into archived_tasks.
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, delete, insert, literal, or_, select
+from sqlalchemy.orm import Session
+
+from app.database import Task, ArchivedTask
+
+ARCHIVED_COLUMNS = [column.name for column in Task.__table__.columns]
+ARCHIVE_BATCH_SIZE = 500
+
+
+def archive_tasks(db: Session, older_than_days: int) -> int:
+    """
+    Archive tasks completed or soft deleted more than `older_than_days` ago.
+    Returns the number of archived tasks
+    """
+    now = datetime.utcnow()
+    cutoff = now - timedelta(days=older_than_days)
+    stale = or_(
+        and_(Task.status == "completed", Task.updated_at < cutoff),
+        Task.deleted_at < cutoff,
+    )
+    tasks_table = Task.__table__
+
+    archived = 0
+    while True:
+        # Lock the batch (FOR UPDATE on Postgres) so update_task cannot change a task between
+        # the copy and the delete. SQLite holds its single write lock from the INSERT onwards,
+        # and both statements re-check `stale` for rows changed before that.
+        ids = db.execute(
+            select(Task.id).where(stale).order_by(Task.id).limit(ARCHIVE_BATCH_SIZE).with_for_update()
+        ).scalars().all()
+        if not ids:
+            break
+
+        moving = and_(Task.id.in_(ids), stale)
+        copied = db.execute(
+            insert(ArchivedTask).from_select(
+                ARCHIVED_COLUMNS + ["archived_at"],
+                select(*[tasks_table.c[name] for name in ARCHIVED_COLUMNS], literal(now, ArchivedTask.archived_at.type))
+                .where(moving)
+            )
+        )
+        db.execute(delete(Task).where(moving).execution_options(synchronize_session=False))
+        db.commit()
+        archived += copied.rowcount
+    return archived
@@ -0,0 +1,90 @@
+"""
+Response compression negotiated from the Accept-Encoding header.
+Uses brotli when the client accepts it and the brotli package is installed, gzip otherwise.
+"""
+import os
+
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipMiddleware, GZipResponder, IdentityResponder
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip still works without it
+    brotli = None
+
+# Responses smaller than this are sent as is, compressing them costs more than it saves
+COMPRESSION_MINIMUM_SIZE = int(os.getenv("COMPRESSION_MINIMUM_SIZE", "1000"))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+
+
+def accepted_encodings(accept_encoding: str) -> dict[str, float]:
+    """Encodings listed in an Accept-Encoding header with their q-value weights"""
+    encodings = {}
+    for item in accept_encoding.split(","):
+        name, *params = [part.strip() for part in item.split(";")]
+        quality = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        if name:
+            encodings[name.lower()] = quality
+    return encodings
+
+
+def choose_encoding(accept_encoding: str) -> str | None:
+    """
+    The supported encoding the client weights highest, brotli wins ties.
+    None means send the response uncompressed
+    """
+    weights = accepted_encodings(accept_encoding)
+    supported = ("br", "gzip") if brotli is not None else ("gzip",)
+
+    chosen, chosen_quality = None, 0.0
+    for encoding in supported:
+        quality = weights.get(encoding, weights.get("*", 0.0))
+        if quality > chosen_quality:
+            chosen, chosen_quality = encoding, quality
+    return chosen
+
+
+class BrotliResponder(IdentityResponder):
+    content_encoding = "br"
+
+    def __init__(self, app: ASGIApp, minimum_size: int, quality: int = BROTLI_QUALITY) -> None:
+        super().__init__(app, minimum_size)
+        self.compressor = brotli.Compressor(quality=quality)
+
+    def apply_compression(self, body: bytes, *, more_body: bool) -> bytes:
+        compressed = self.compressor.process(body)
+        if not more_body:
+            compressed += self.compressor.finish()
+        else:
+            compressed += self.compressor.flush()
+        return compressed
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """GZipMiddleware that also offers brotli, picked from the Accept-Encoding weights"""
+
+    def __init__(self, app: ASGIApp, minimum_size: int = COMPRESSION_MINIMUM_SIZE, compresslevel: int = GZIP_LEVEL) -> None:
+        super().__init__(app, minimum_size=minimum_size, compresslevel=compresslevel)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = choose_encoding(Headers(scope=scope).get("Accept-Encoding", ""))
+        if encoding == "br":
+            responder = BrotliResponder(self.app, self.minimum_size)
+        elif encoding == "gzip":
+            responder = GZipResponder(self.app, self.minimum_size, compresslevel=self.compresslevel)
+        else:
+            responder = IdentityResponder(self.app, self.minimum_size)
+
+        await responder(scope, receive, send)
@@ -2,28 +2,47 @@
 Created the Database structure and works for creation of tables for the database.
 """
 import os
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, ForeignKey, Text
+from sqlalchemy import create_engine, event, Column, Integer, SmallInteger, String, DateTime, ForeignKey, Text, CheckConstraint, UniqueConstraint, Index, text
+from sqlalchemy.types import TypeDecorator
 from datetime import datetime
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
-# Get database URL from environment variable
-DATABASE_URL = os.getenv("DATABASE_URL")
+# Get database URL from environment variable, SQLite file for local development
+DATABASE_URL = os.getenv("DATABASE_URL") or "sqlite:///./tasks.db"
+
+def make_engine(url: str):
+    """
+    Create an engine for `url`, used for the app database and for test databases.
+    In-memory SQLite gets a StaticPool so every session sees the same database.
+    """
+    if url.startswith("sqlite"):
+        if url in ("sqlite://", "sqlite:///:memory:"):
+            sqlite_engine = create_engine(
+                url, connect_args={"check_same_thread": False}, poolclass=StaticPool
+            )
+        else:
+            sqlite_engine = create_engine(url, connect_args={"check_same_thread": False})
+
+        # SQLite ignores foreign keys unless asked, ON DELETE CASCADE needs them
+        @event.listens_for(sqlite_engine, "connect")
+        def enable_foreign_keys(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute("PRAGMA foreign_keys=ON")
+            cursor.close()
+
+        return sqlite_engine
 
-# Handle SQLite for local development
-if DATABASE_URL is None or DATABASE_URL.startswith("sqlite"):
-    DATABASE_URL = "sqlite:///./tasks.db"
-    engine = create_engine(
-        DATABASE_URL, connect_args={"check_same_thread": False}
-    )
-else:
     # PostgreSQL for production
-    engine = create_engine(DATABASE_URL)
+    return create_engine(url)
+
+engine = make_engine(DATABASE_URL)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -37,6 +56,46 @@ def get_db():
         db.close()
 
 
+# Allowed values for the coded task columns. The position of each value is the
+# integer stored in the database, so only ever append new values to the end.
+TASK_STATUSES = ("pending", "in_progress", "completed")
+TASK_PRIORITIES = ("Low", "Normal", "High")
+
+
+class CodedString(TypeDecorator):
+    """
+    Stores one of a fixed set of strings as a SmallInteger code.
+    The API and ORM keep working with the string values, the table only sees the code.
+    """
+    impl = SmallInteger
+    cache_ok = True
+
+    def __init__(self, values):
+        super().__init__()
+        self.values = tuple(values)
+        self.codes = {value: code for code, value in enumerate(self.values)}
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        if value not in self.codes:
+            raise ValueError(f"Invalid value {value!r}, expected one of {self.values}")
+        return self.codes[value]
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return self.values[value]
+
+
+def code_check(column: str, values, table: str = "tasks") -> CheckConstraint:
+    """DB level CHECK constraint so only known codes can be stored in a coded column"""
+    return CheckConstraint(
+        f"{column} BETWEEN 0 AND {len(values) - 1}",
+        name=f"ck_{table}_{column}"
+    )
+
+
 class User(Base):
     """
     SQLAlchemy model for users table
@@ -80,24 +139,83 @@ class Task(Base):
     """
     # Tablename
     __tablename__ = "tasks"
+    __table_args__ = (
+        code_check("status", TASK_STATUSES),
+        code_check("priority", TASK_PRIORITIES),
+        # Partial index so the hot path only carries tasks that are not soft deleted
+        Index(
+            "ix_tasks_hot_project_status", "project_id", "status",
+            postgresql_where=text("deleted_at IS NULL"),
+            sqlite_where=text("deleted_at IS NULL"),
+        ),
+        # Never reuse ids of archived tasks, archived_tasks keeps them
+        {"sqlite_autoincrement": True},
+    )
 
     # Columns
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
     title = Column(String(200), nullable=False)
     description = Column(Text, nullable=True)
-    status = Column(String, default="pending")
+    status = Column(CodedString(TASK_STATUSES), nullable=False, default="pending")
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     # attributes added for the projects and owner as creator
     project_id = Column(Integer, ForeignKey("projects.id", ondelete="CASCADE"), nullable = False)
-    priority = Column(String, default="Normal") # "Low", "Normal", "High"
+    priority = Column(CodedString(TASK_PRIORITIES), nullable=False, default="Normal")
     due_date = Column(DateTime)
+    deleted_at = Column(DateTime, nullable=True)  # soft delete, NULL for live tasks
 
     # Relationships
     project = relationship("Project", back_populates="tasks")
     owner = relationship("User", back_populates="tasks")
 
-def create_tables():
-    Base.metadata.create_all(bind=engine)
+class ArchivedTask(Base):
+    """
+    SQLAlchemy model for archived_tasks table.
+    Completed and soft deleted tasks are moved here by app/archive.py to keep the tasks table small,
+    rows keep the id they had in the tasks table.
+    """
+    # Tablename
+    __tablename__ = "archived_tasks"
+    __table_args__ = (
+        code_check("status", TASK_STATUSES, table="archived_tasks"),
+        code_check("priority", TASK_PRIORITIES, table="archived_tasks"),
+    )
+
+    # Columns
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), index=True)
+    title = Column(String(200), nullable=False)
+    description = Column(Text, nullable=True)
+    status = Column(CodedString(TASK_STATUSES), nullable=False)
+    created_at = Column(DateTime)
+    updated_at = Column(DateTime)
+    project_id = Column(Integer, ForeignKey("projects.id", ondelete="CASCADE"), nullable=False, index=True)
+    priority = Column(CodedString(TASK_PRIORITIES), nullable=False)
+    due_date = Column(DateTime)
+    deleted_at = Column(DateTime, nullable=True)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
+class IdempotencyKey(Base):
+    """
+    SQLAlchemy model for stored responses of requests sent with an Idempotency-Key header
+    """
+    # Tablename
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (
+        UniqueConstraint("scope", "key", name="uq_idempotency_keys_scope_key"),
+    )
+
+    # Columns
+    id = Column(Integer, primary_key=True)
+    key = Column(String(255), nullable=False)
+    scope = Column(String(255), nullable=False)  # e.g. "POST /tasks"
+    request_hash = Column(String(64), nullable=False)
+    status_code = Column(Integer, nullable=True)  # NULL while the first request is still running
+    response_body = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+def create_tables(bind=None):
+    Base.metadata.create_all(bind=bind or engine)
@@ -0,0 +1,218 @@
+"""
+Idempotency-Key support for write endpoints.
+
+The first request with a given key claims it and its response is stored. Retries with the same
+key get the stored response back without running the endpoint again, and duplicates that arrive
+while the first request is still running wait for it to finish.
+"""
+import asyncio
+import hashlib
+import os
+import re
+from datetime import datetime, timedelta
+
+from fastapi import Request, status
+from fastapi.responses import JSONResponse, Response
+from sqlalchemy import delete, or_, select
+from sqlalchemy.exc import IntegrityError
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.types import Receive, Scope, Send
+
+from app.database import SessionLocal, IdempotencyKey
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+IDEMPOTENCY_TTL_HOURS = int(os.getenv("IDEMPOTENCY_TTL_HOURS", "24"))
+IDEMPOTENCY_MAX_KEYS = int(os.getenv("IDEMPOTENCY_MAX_KEYS", "10000"))
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "30"))
+# Unfinished claims older than this are assumed to belong to a crashed worker
+IDEMPOTENCY_ABANDON_SECONDS = float(os.getenv("IDEMPOTENCY_ABANDON_SECONDS", "600"))
+POLL_INTERVAL_SECONDS = 0.1
+
+# Sessions for the idempotency_keys table, the middleware runs outside get_db.
+# Tests point this at their own database
+session_factory = SessionLocal
+
+# (method, path pattern) of the endpoints that honour the header
+IDEMPOTENT_ROUTES = [
+    ("POST", re.compile(r"^/auth/register$")),
+    ("POST", re.compile(r"^/tasks$")),
+    ("POST", re.compile(r"^/projects$")),
+    ("PATCH", re.compile(r"^/tasks/\d+$")),
+]
+
+
+def is_idempotent_route(method: str, path: str) -> bool:
+    return any(method == route_method and pattern.match(path) for route_method, pattern in IDEMPOTENT_ROUTES)
+
+
+def prune_keys(db):
+    """
+    Drop expired keys, abandoned claims and finished keys over IDEMPOTENCY_MAX_KEYS.
+    Claims of requests that are still running are never dropped by the size limit.
+    """
+    now = datetime.utcnow()
+    finished = IdempotencyKey.status_code.isnot(None)
+    db.execute(delete(IdempotencyKey).where(or_(
+        finished & (IdempotencyKey.created_at < now - timedelta(hours=IDEMPOTENCY_TTL_HOURS)),
+        ~finished & (IdempotencyKey.created_at < now - timedelta(seconds=IDEMPOTENCY_ABANDON_SECONDS)),
+    )))
+    oldest_kept = (
+        select(IdempotencyKey.id)
+        .order_by(IdempotencyKey.id.desc())
+        .offset(IDEMPOTENCY_MAX_KEYS - 1)
+        .limit(1)
+        .scalar_subquery()
+    )
+    db.execute(delete(IdempotencyKey).where(finished, IdempotencyKey.id < oldest_kept))
+
+
+def claim_key(scope: str, key: str, request_hash: str):
+    """
+    Try to claim the key for this request.
+    Returns None when claimed, otherwise the existing row (finished or still in progress)
+    """
+    db = session_factory()
+    try:
+        prune_keys(db)
+        db.add(IdempotencyKey(scope=scope, key=key, request_hash=request_hash))
+        db.commit()
+        return None
+    except IntegrityError:
+        db.rollback()
+        existing = db.query(IdempotencyKey).filter(
+            IdempotencyKey.scope == scope, IdempotencyKey.key == key
+        ).first()
+        if existing is None:
+            # The other request released its claim in the meantime, try again
+            return claim_key(scope, key, request_hash)
+        db.expunge(existing)
+        return existing
+    finally:
+        db.close()
+
+
+def get_key(scope: str, key: str):
+    db = session_factory()
+    try:
+        return db.query(IdempotencyKey).filter(
+            IdempotencyKey.scope == scope, IdempotencyKey.key == key
+        ).first()
+    finally:
+        db.close()
+
+
+def store_response(scope: str, key: str, status_code: int, body: bytes):
+    db = session_factory()
+    try:
+        db.query(IdempotencyKey).filter(
+            IdempotencyKey.scope == scope, IdempotencyKey.key == key
+        ).update({"status_code": status_code, "response_body": body.decode()})
+        db.commit()
+    finally:
+        db.close()
+
+
+def release_key(scope: str, key: str):
+    """Remove an unfinished claim so the request can be retried"""
+    db = session_factory()
+    try:
+        db.query(IdempotencyKey).filter(
+            IdempotencyKey.scope == scope, IdempotencyKey.key == key
+        ).delete()
+        db.commit()
+    finally:
+        db.close()
+
+
+def replay(record: IdempotencyKey) -> Response:
+    return Response(
+        content=record.response_body,
+        status_code=record.status_code,
+        media_type="application/json",
+        headers={"Idempotent-Replayed": "true"},
+    )
+
+
+class IdempotencyMiddleware(BaseHTTPMiddleware):
+    """
+    Stores and replays responses of the write endpoints in IDEMPOTENT_ROUTES
+    when the client sends an Idempotency-Key header
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        # Everything else skips BaseHTTPMiddleware, which would turn every response into a stream
+        if (
+            scope["type"] != "http"
+            or IDEMPOTENCY_HEADER not in Headers(scope=scope)
+            or not is_idempotent_route(scope["method"], scope["path"])
+        ):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+    async def dispatch(self, request: Request, call_next):
+        key = request.headers[IDEMPOTENCY_HEADER]
+        if not key or len(key) > 255:
+            return JSONResponse(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                content={"detail": "Idempotency-Key must be 1 to 255 characters"}
+            )
+
+        scope = f"{request.method} {request.url.path}"
+        # The query string is part of the request, e.g. POST /projects?user_id=...
+        fingerprint = request.url.query.encode() + b"\n" + await request.body()
+        request_hash = hashlib.sha256(fingerprint).hexdigest()
+
+        existing = await run_in_threadpool(claim_key, scope, key, request_hash)
+        if existing is not None:
+            return await self.wait_for_response(existing, scope, key, request_hash, request, call_next)
+
+        return await self.run_and_store(scope, key, request, call_next)
+
+    async def wait_for_response(self, record, scope, key, request_hash, request, call_next):
+        """Wait for the request that owns the key and return its stored response"""
+        waited = 0.0
+        while True:
+            if record is None:
+                # The first request failed and released the key, this one takes over
+                existing = await run_in_threadpool(claim_key, scope, key, request_hash)
+                if existing is None:
+                    return await self.run_and_store(scope, key, request, call_next)
+                record = existing
+
+            if record.request_hash != request_hash:
+                return JSONResponse(
+                    status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
+                    content={"detail": "Idempotency-Key was already used with a different request"}
+                )
+
+            if record.status_code is not None:
+                return replay(record)
+
+            if waited >= IDEMPOTENCY_WAIT_SECONDS:
+                return JSONResponse(
+                    status_code=status.HTTP_409_CONFLICT,
+                    content={"detail": "A request with this Idempotency-Key is still in progress"}
+                )
+
+            await asyncio.sleep(POLL_INTERVAL_SECONDS)
+            waited += POLL_INTERVAL_SECONDS
+            record = await run_in_threadpool(get_key, scope, key)
+
+    async def run_and_store(self, scope, key, request, call_next):
+        try:
+            response = await call_next(request)
+            body = b"".join([chunk async for chunk in response.body_iterator])
+        except Exception:
+            await run_in_threadpool(release_key, scope, key)
+            raise
+
+        # Server errors are not stored so the client can retry them
+        if response.status_code >= 500:
+            await run_in_threadpool(release_key, scope, key)
+        else:
+            await run_in_threadpool(store_response, scope, key, response.status_code, body)
+
+        return Response(content=body, status_code=response.status_code, headers=response.headers)
@@ -1,9 +1,11 @@
 import os
-from fastapi import FastAPI, status, HTTPException, Depends, Response
+from fastapi import FastAPI, status, HTTPException, Depends, Response, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
-from app.database import get_db, User, Task, Project
+from app.database import get_db, User, Task, Project, ArchivedTask
 from app.models import UserCreate, UserResponse, TaskCreate, TaskResponse, TaskUpdate, ProjectCreate, ProjectResponse
-from typing import Literal
+from app.models import TaskStatus, TaskPriority
 from fastapi.middleware.cors import CORSMiddleware
 from datetime import datetime, timedelta
 # for the Error handling
@@ -16,6 +18,8 @@ load_dotenv()
 from app.auth import get_current_user
 from app.security import get_password_hash, verify_password, create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
 from app.models import UserProfile, UserLogin, UserRegister, Token
+from app.idempotency import IdempotencyMiddleware
+from app.compression import CompressionMiddleware
 
 # Entry point
 app = FastAPI(
@@ -27,6 +31,10 @@ app = FastAPI(
 # Get frontend URL from environment
 FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:5173")
 
+# Replays stored responses for retried writes sent with an Idempotency-Key header.
+# Added before CORS so replayed responses still get the CORS headers
+app.add_middleware(IdempotencyMiddleware)
+
 # CORS for backend to frontend connections
 app.add_middleware(
     CORSMiddleware,
@@ -40,6 +48,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# gzip/brotli for larger responses, added last so it also compresses replayed responses
+app.add_middleware(CompressionMiddleware)
+
 # ========= auth routes ===========
 @app.post("/auth/register", response_model=UserProfile, status_code= status.HTTP_201_CREATED)
 def register_user(user: UserRegister, db: Session = Depends(get_db)):
@@ -196,37 +207,91 @@ def create_task(task: TaskCreate, db: Session = Depends(get_db)):
     return db_task
 
 
+# Sparse fieldsets: ?fields=id,title,status only selects and returns those columns
+def task_fields(
+    fields: str | None = Query(None, description="Comma separated task fields to return, e.g. id,title,status,due_date")
+) -> list[str] | None:
+    if fields is None:
+        return None
+
+    selected = ["id"]
+    for field in fields.split(","):
+        field = field.strip()
+        if field and field not in selected:
+            selected.append(field)
+
+    unknown = [field for field in selected if field not in TaskResponse.model_fields]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown task fields: {', '.join(unknown)}")
+    return selected
+
+def select_fields(query, model, fields: list[str] | None):
+    """Narrow the SELECT to the requested columns, so e.g. description is never loaded"""
+    if fields is None:
+        return query
+    return query.with_entities(*[getattr(model, field) for field in fields])
+
+def sparse_response(rows) -> JSONResponse:
+    return JSONResponse(content=jsonable_encoder([row._asdict() for row in rows]))
+
 # List tasks
 @app.get("/tasks", response_model=list[TaskResponse])
 def list_tasks(
     user_id: int | None = None,
     project_id: int | None = None,
-    status: Literal["pending", "completed", "in_progress"] | None = None,
-    # priority: Literal["Normal", "High", "Low"] | None = None,
+    status: TaskStatus | None = None,
+    priority: TaskPriority | None = None,
+    include_archived: bool = False,
+    fields: list[str] | None = Depends(task_fields),
     db: Session = Depends(get_db)
     ):
-    query = db.query(Task)
-    if user_id is not None:
-        query = query.filter(Task.user_id == user_id)
-
-    if project_id is not None:
-        query = query.filter(Task.project_id == project_id)
-
-    if status is not None:
-        query = query.filter(Task.status == status)
-
-    # if priority is not None:
-    #     query = query.filter(Task.priority == priority)
-
-    tasks = query.all()
+    def filtered(model):
+        query = db.query(model).filter(model.deleted_at.is_(None))
+        if user_id is not None:
+            query = query.filter(model.user_id == user_id)
+
+        if project_id is not None:
+            query = query.filter(model.project_id == project_id)
+
+        # status and priority are compared as small integer codes in the DB
+        if status is not None:
+            query = query.filter(model.status == status)
+
+        if priority is not None:
+            query = query.filter(model.priority == priority)
+        # Explicit order, otherwise the rows follow whichever index the planner picks
+        return select_fields(query.order_by(model.id), model, fields)
+
+    # Only the hot tasks table is read unless archived tasks are asked for
+    tasks = filtered(Task).all()
+    if include_archived:
+        tasks += filtered(ArchivedTask).all()
+        tasks.sort(key=lambda task: task.id)
+
+    if fields is not None:
+        return sparse_response(tasks)
     return tasks
 
 # Get the task by id
 @app.get("/tasks/{task_id}", response_model=TaskResponse)
-def get_task(task_id: int, db: Session = Depends(get_db)):
-    task = db.query(Task).filter(Task.id == task_id).first()
+def get_task(
+    task_id: int,
+    fields: list[str] | None = Depends(task_fields),
+    db: Session = Depends(get_db)
+    ):
+    query = db.query(Task).filter(Task.id == task_id, Task.deleted_at.is_(None))
+    task = select_fields(query, Task, fields).first()
+    if not task:
+        # Archived tasks keep their id, so old links still work
+        query = db.query(ArchivedTask).filter(
+            ArchivedTask.id == task_id, ArchivedTask.deleted_at.is_(None)
+        )
+        task = select_fields(query, ArchivedTask, fields).first()
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
+
+    if fields is not None:
+        return JSONResponse(content=jsonable_encoder(task._asdict()))
     return task
 
 
@@ -234,7 +299,7 @@ def get_task(task_id: int, db: Session = Depends(get_db)):
 @app.patch("/tasks/{task_id}", response_model=TaskResponse)
 def update_task(task_id: int, task_update: TaskUpdate, db: Session = Depends(get_db)):
     # 1. Check if task exist
-    task = db.query(Task).filter(Task.id == task_id).first()
+    task = db.query(Task).filter(Task.id == task_id, Task.deleted_at.is_(None)).first()
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
 
@@ -253,10 +318,11 @@ def update_task(task_id: int, task_update: TaskUpdate, db: Session = Depends(get
 # To delete a task
 @app.delete("/tasks/{task_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_task(task_id: int, db: Session = Depends(get_db)):
-    task = db.query(Task).filter(Task.id == task_id).first()
+    task = db.query(Task).filter(Task.id == task_id, Task.deleted_at.is_(None)).first()
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
-    db.delete(task)
+    # Soft delete, the row is moved to archived_tasks later by archive_tasks.py
+    task.deleted_at = datetime.utcnow()
     db.commit()
     return
 
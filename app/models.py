@@ -6,6 +6,11 @@ from pydantic import BaseModel, EmailStr, field_validator
 from datetime import datetime
 from typing import Literal
 
+# API values for the coded task columns, in the same order as TASK_STATUSES / TASK_PRIORITIES
+# in app/database.py (tests/test_task_codes.py checks they match)
+TaskStatus = Literal["pending", "in_progress", "completed"]
+TaskPriority = Literal["Low", "Normal", "High"]
+
 # ========== Auth Schemas ==============
 class UserRegister(BaseModel):
     """Schema for user registration"""
@@ -112,8 +117,8 @@ class TaskCreate(BaseModel):
     project_id: int
     title: str
     description: str | None = None
-    status: Literal["pending", "completed", "in_progress"] = "pending"
-    priority: Literal["Normal", "High", "Low"] = "Normal"
+    status: TaskStatus = "pending"
+    priority: TaskPriority = "Normal"
     due_date: datetime | None = None
 
     @field_validator("title")
@@ -131,10 +136,10 @@ class TaskResponse(BaseModel):
     project_id: int
     title: str
     description: str | None = None
-    status: str
+    status: TaskStatus
     created_at: datetime
     updated_at: datetime
-    priority: str
+    priority: TaskPriority
     due_date: datetime | None = None
 
     class Config:
@@ -144,8 +149,8 @@ class TaskResponse(BaseModel):
 class TaskUpdate(BaseModel):
     title: str | None = None
     description: str | None = None
-    status: Literal["pending", "completed", "in_progress"] | None = None
-    priority: Literal["Normal", "High", "Low"] | None = None
+    status: TaskStatus | None = None
+    priority: TaskPriority | None = None
     due_date: datetime | None = None
 
     @field_validator("title")
@@ -156,3 +161,10 @@ class TaskUpdate(BaseModel):
             if len(value) > 200:
                 raise ValueError("Title cannot exceed 200 characters")
         return value
+
+    @field_validator("status", "priority")
+    def not_null(cls, value, info):
+        # Leaving the field out keeps the current value, an explicit null is not allowed
+        if value is None:
+            raise ValueError(f"{info.field_name} cannot be null")
+        return value
@@ -0,0 +1,36 @@
+"""
+Archives completed and soft deleted tasks older than N days, meant to run from a cron job.
+Usage: python archive_tasks.py --days 30
+"""
+import argparse
+import sys
+from app.database import engine, SessionLocal
+from app.archive import archive_tasks
+from migrate_db import schema_is_current
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive old completed and deleted tasks")
+    parser.add_argument("--days", type=int, default=30, help="archive tasks finished more than this many days ago")
+    args = parser.parse_args()
+
+    with engine.connect() as conn:
+        if not schema_is_current(conn):
+            print("❌ Database schema is out of date, run python migrate_db.py first")
+            sys.exit(1)
+
+    db = SessionLocal()
+    try:
+        archived = archive_tasks(db, args.days)
+        print(f"✅ Archived {archived} tasks older than {args.days} days")
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        db.rollback()
+        # Non-zero exit so cron reports the failed run
+        sys.exit(1)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Upgrades a database created by an older version of the app, run it before starting the new version:
+1. converts tasks.status / tasks.priority from text to SmallInteger codes
+2. adds tasks.deleted_at, the hot path index and the archived_tasks / idempotency_keys tables
+Safe to run more than once, every step is skipped if it was already applied.
+"""
+from sqlalchemy import inspect, text
+from app.database import Base, engine, Task, TASK_STATUSES, TASK_PRIORITIES
+
+CODED_COLUMNS = {
+    "status": (TASK_STATUSES, "pending"),
+    "priority": (TASK_PRIORITIES, "Normal"),
+}
+
+
+def code_case(column: str, values, default: str) -> str:
+    """SQL CASE expression mapping the old text values to their codes"""
+    whens = " ".join(f"WHEN '{value}' THEN {code}" for code, value in enumerate(values))
+    return f"CASE {column} {whens} ELSE {values.index(default)} END"
+
+
+def needs_task_codes(conn) -> bool:
+    inspector = inspect(conn)
+    if "tasks" not in inspector.get_table_names():
+        return False
+    columns = {col["name"]: col for col in inspector.get_columns("tasks")}
+    return "INT" not in str(columns["status"]["type"]).upper()
+
+
+def needs_soft_delete(conn) -> bool:
+    inspector = inspect(conn)
+    if "tasks" not in inspector.get_table_names():
+        return False
+    columns = [col["name"] for col in inspector.get_columns("tasks")]
+    indexes = [index["name"] for index in inspector.get_indexes("tasks")]
+    return (
+        "deleted_at" not in columns
+        or "ix_tasks_hot_project_status" not in indexes
+        or "archived_tasks" not in inspector.get_table_names()
+    )
+
+
+def schema_is_current(conn) -> bool:
+    return not needs_task_codes(conn) and not needs_soft_delete(conn)
+
+
+def count_unmapped(conn) -> dict:
+    """Number of rows per coded column whose old value is NULL or unknown, they get the default"""
+    counts = {}
+    for column, (values, default) in CODED_COLUMNS.items():
+        known = ", ".join(f"'{value}'" for value in values)
+        counts[column] = conn.execute(text(
+            f"SELECT COUNT(*) FROM tasks WHERE {column} IS NULL OR {column} NOT IN ({known})"
+        )).scalar()
+    return counts
+
+
+def migrate_postgres(conn):
+    for column, (values, default) in CODED_COLUMNS.items():
+        conn.execute(text(f"ALTER TABLE tasks ALTER COLUMN {column} DROP DEFAULT"))
+        conn.execute(text(
+            f"ALTER TABLE tasks ALTER COLUMN {column} TYPE SMALLINT "
+            f"USING {code_case(column, values, default)}"
+        ))
+        conn.execute(text(f"ALTER TABLE tasks ALTER COLUMN {column} SET NOT NULL"))
+        conn.execute(text(
+            f"ALTER TABLE tasks ADD CONSTRAINT ck_tasks_{column} "
+            f"CHECK ({column} BETWEEN 0 AND {len(values) - 1})"
+        ))
+
+
+def migrate_sqlite(conn):
+    # SQLite cannot change a column type, so rebuild the table and copy the rows across
+    inspector = inspect(conn)
+    old_columns = [col["name"] for col in inspector.get_columns("tasks")]
+    old_indexes = [index["name"] for index in inspector.get_indexes("tasks")]
+
+    conn.execute(text("ALTER TABLE tasks RENAME TO tasks_old"))
+    for index in old_indexes:
+        conn.execute(text(f"DROP INDEX IF EXISTS {index}"))
+    Base.metadata.tables["tasks"].create(bind=conn)
+
+    select_columns = [
+        code_case(col, *CODED_COLUMNS[col]) if col in CODED_COLUMNS else col
+        for col in old_columns
+    ]
+    conn.execute(text(
+        f"INSERT INTO tasks ({', '.join(old_columns)}) "
+        f"SELECT {', '.join(select_columns)} FROM tasks_old"
+    ))
+    conn.execute(text("DROP TABLE tasks_old"))
+
+
+def migrate_soft_delete(conn):
+    columns = [col["name"] for col in inspect(conn).get_columns("tasks")]
+    if "deleted_at" not in columns:
+        conn.execute(text("ALTER TABLE tasks ADD COLUMN deleted_at TIMESTAMP"))
+
+    # create_all only creates missing tables, indexes of existing tables are created one by one
+    Base.metadata.create_all(bind=conn)
+    for index in Task.__table__.indexes:
+        index.create(bind=conn, checkfirst=True)
+
+
+def migrate(bind=None):
+    with (bind or engine).begin() as conn:
+        if needs_task_codes(conn):
+            print("Converting tasks.status and tasks.priority to codes...")
+            for column, count in count_unmapped(conn).items():
+                if count:
+                    default = CODED_COLUMNS[column][1]
+                    print(f"⚠️  {count} tasks had a missing or unknown {column}, set to '{default}'")
+            if conn.dialect.name == "postgresql":
+                migrate_postgres(conn)
+            else:
+                migrate_sqlite(conn)
+        else:
+            print("ℹ️  tasks table already uses coded status/priority")
+
+        if needs_soft_delete(conn):
+            print("Adding soft delete and archive tables...")
+            migrate_soft_delete(conn)
+        else:
+            print("ℹ️  soft delete and archive tables already exist")
+    print("✅ Migration complete!")
+
+
+if __name__ == "__main__":
+    migrate()
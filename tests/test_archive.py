@@ -0,0 +1,109 @@
+"""
+Soft delete and archiving of completed tasks.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+import archive_tasks as archive_script
+from app.archive import archive_tasks
+from app.database import ArchivedTask, Task
+
+LONG_AGO = datetime.utcnow() - timedelta(days=40)
+
+
+def task_ids(response):
+    return sorted(task["id"] for task in response.json())
+
+
+def test_delete_is_a_soft_delete(client, db, make_task):
+    task_id = make_task().id
+
+    assert client.delete(f"/tasks/{task_id}").status_code == 204
+
+    assert client.get(f"/tasks/{task_id}").status_code == 404
+    assert client.get("/tasks").json() == []
+    assert db.get(Task, task_id).deleted_at is not None
+
+
+def test_archive_moves_only_old_completed_tasks(client, db, make_project, make_task):
+    project = make_project()
+    project_id, user_id = project.id, project.created_by
+    old_done = make_task(project_id=project_id, user_id=user_id, status="completed", updated_at=LONG_AGO).id
+    new_done = make_task(project_id=project_id, user_id=user_id, status="completed").id
+    old_open = make_task(project_id=project_id, user_id=user_id, status="pending", updated_at=LONG_AGO).id
+
+    assert archive_tasks(db, older_than_days=30) == 1
+
+    assert db.get(Task, old_done) is None
+    assert db.get(ArchivedTask, old_done).status == "completed"
+    assert task_ids(client.get("/tasks")) == [new_done, old_open]
+    assert task_ids(client.get("/tasks?include_archived=true")) == [old_done, new_done, old_open]
+    assert task_ids(client.get("/tasks?include_archived=true&status=completed")) == [old_done, new_done]
+
+
+def test_archived_task_is_still_readable_by_id(client, db, make_task):
+    task_id = make_task(status="completed", updated_at=LONG_AGO).id
+    archive_tasks(db, older_than_days=30)
+
+    response = client.get(f"/tasks/{task_id}")
+
+    assert response.status_code == 200
+    assert response.json()["title"] == "Task 1"
+    assert client.patch(f"/tasks/{task_id}", json={"status": "pending"}).status_code == 404
+
+
+def test_archived_soft_deleted_tasks_stay_hidden(client, db, make_task):
+    task_id = make_task(deleted_at=LONG_AGO).id
+
+    assert archive_tasks(db, older_than_days=30) == 1
+
+    assert client.get("/tasks?include_archived=true").json() == []
+    assert client.get(f"/tasks/{task_id}").status_code == 404
+
+
+def test_deleting_a_project_removes_its_archived_tasks(client, db, make_task):
+    task = make_task(status="completed", updated_at=LONG_AGO)
+    project_id = task.project_id
+    archive_tasks(db, older_than_days=30)
+
+    assert client.delete(f"/projects/{project_id}").status_code == 204
+
+    assert db.query(ArchivedTask).count() == 0
+    assert client.get("/tasks?include_archived=true").json() == []
+
+
+def test_tasks_are_listed_in_id_order(client, db, make_project, make_task):
+    project = make_project()
+    project_id, user_id = project.id, project.created_by
+    # Statuses out of order, so an index on (project_id, status) would reorder them
+    for status in ["completed", "pending", "in_progress", "completed", "pending"]:
+        make_task(project_id=project_id, user_id=user_id, status=status)
+    db.query(Task).filter(Task.id.in_([1, 4])).update({Task.updated_at: LONG_AGO}, synchronize_session=False)
+    db.commit()
+
+    assert [task["id"] for task in client.get("/tasks").json()] == [1, 2, 3, 4, 5]
+    assert [task["id"] for task in client.get(f"/tasks?project_id={project_id}&fields=title").json()] == [1, 2, 3, 4, 5]
+
+    archive_tasks(db, older_than_days=30)
+
+    assert [task["id"] for task in client.get("/tasks").json()] == [2, 3, 5]
+    assert [task["id"] for task in client.get("/tasks?include_archived=true").json()] == [1, 2, 3, 4, 5]
+
+
+def test_archive_script_exits_non_zero_on_failure(engine, monkeypatch, capsys):
+    def broken_archive(db, days):
+        raise RuntimeError("database went away")
+
+    monkeypatch.setattr(archive_script, "engine", engine)
+    monkeypatch.setattr(archive_script, "SessionLocal", sessionmaker(bind=engine))
+    monkeypatch.setattr(archive_script, "schema_is_current", lambda conn: True)
+    monkeypatch.setattr(archive_script, "archive_tasks", broken_archive)
+    monkeypatch.setattr("sys.argv", ["archive_tasks.py", "--days", "30"])
+
+    with pytest.raises(SystemExit) as exit_info:
+        archive_script.main()
+
+    assert exit_info.value.code == 1
+    assert "database went away" in capsys.readouterr().out
@@ -0,0 +1,80 @@
+"""
+Response compression and fields= sparse fieldsets.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.archive import archive_tasks
+from app.compression import COMPRESSION_MINIMUM_SIZE, choose_encoding
+
+
+@pytest.mark.parametrize("accept_encoding, expected", [
+    ("br, gzip", "br"),
+    ("gzip, br", "br"),
+    ("gzip", "gzip"),
+    ("br;q=0.5, gzip", "gzip"),
+    ("br;q=0, gzip", "gzip"),
+    ("gzip;q=0", None),
+    ("identity", None),
+    ("", None),
+    ("*", "br"),
+    ("*;q=0.5, gzip", "gzip"),
+])
+def test_choose_encoding(accept_encoding, expected):
+    assert choose_encoding(accept_encoding) == expected
+
+
+@pytest.fixture
+def large_board(make_project, make_task):
+    project = make_project()
+    for _ in range(10):
+        make_task(project_id=project.id, user_id=project.created_by, description="lorem ipsum " * 20)
+
+
+@pytest.mark.parametrize("accept_encoding, expected", [
+    ("br, gzip", "br"),
+    ("br;q=0.5, gzip", "gzip"),
+    ("br;q=0, gzip;q=0", None),
+    ("identity", None),
+])
+def test_large_responses_are_compressed(client, large_board, accept_encoding, expected):
+    response = client.get("/tasks", headers={"Accept-Encoding": accept_encoding})
+
+    assert response.status_code == 200
+    assert response.headers.get("Content-Encoding") == expected
+    assert response.headers["Vary"] == "Accept-Encoding"
+    assert len(response.json()) == 10
+
+
+def test_small_responses_are_not_compressed(client):
+    response = client.get("/tasks", headers={"Accept-Encoding": "br, gzip"})
+
+    assert len(response.content) < COMPRESSION_MINIMUM_SIZE
+    assert "Content-Encoding" not in response.headers
+
+
+def test_get_task_fields(client, make_task):
+    task_id = make_task(status="in_progress").id
+
+    response = client.get(f"/tasks/{task_id}?fields=title,status")
+
+    assert response.json() == {"id": task_id, "title": "Task 1", "status": "in_progress"}
+
+
+def test_get_task_fields_from_archive(client, db, make_task):
+    task_id = make_task(status="completed", updated_at=datetime.utcnow() - timedelta(days=40)).id
+    archive_tasks(db, older_than_days=30)
+
+    response = client.get(f"/tasks/{task_id}?fields=title,due_date")
+
+    assert response.json() == {"id": task_id, "title": "Task 1", "due_date": None}
+
+
+def test_unknown_fields_are_rejected(client, make_task):
+    task_id = make_task().id
+
+    assert client.get("/tasks?fields=title,secret").status_code == 400
+    response = client.get(f"/tasks/{task_id}?fields=password_hash")
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Unknown task fields: password_hash"
@@ -0,0 +1,141 @@
+"""
+Idempotency-Key behaviour: replay, mismatches, failures, concurrent duplicates and pruning.
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import idempotency, main
+from app.database import Base, IdempotencyKey, User, make_engine
+
+
+def register(client, key, email="alice@example.com"):
+    return client.post(
+        "/auth/register",
+        json={"name": "Alice", "email": email, "password": "password123"},
+        headers={"Idempotency-Key": key},
+    )
+
+
+def test_key_reused_with_different_query_string_is_rejected(client, make_user):
+    first_id, second_id = make_user().id, make_user().id
+    headers = {"Idempotency-Key": "project-1"}
+
+    first = client.post(f"/projects?user_id={first_id}", json={"name": "P"}, headers=headers)
+    second = client.post(f"/projects?user_id={second_id}", json={"name": "P"}, headers=headers)
+
+    assert first.status_code == 201
+    assert second.status_code == 422
+    assert len(client.get("/projects").json()) == 1
+
+
+def test_key_reused_with_different_body_is_rejected(client):
+    assert register(client, "register-1").status_code == 201
+
+    response = register(client, "register-1", email="bob@example.com")
+
+    assert response.status_code == 422
+
+
+def test_claim_is_released_when_the_request_fails(client, db, monkeypatch):
+    real_hash = main.get_password_hash
+
+    def broken_hash(password):
+        raise RuntimeError("hashing backend down")
+
+    monkeypatch.setattr(main, "get_password_hash", broken_hash)
+    with pytest.raises(RuntimeError):
+        register(client, "register-2")
+    assert db.query(IdempotencyKey).count() == 0
+
+    monkeypatch.setattr(main, "get_password_hash", real_hash)
+    retry = register(client, "register-2")
+
+    assert retry.status_code == 201
+    assert "Idempotent-Replayed" not in retry.headers
+
+
+def test_concurrent_duplicates_wait_for_the_first_request(tmp_path, client_for, monkeypatch):
+    # A file database, threads must not share the single in-memory connection
+    engine = make_engine(f"sqlite:///{tmp_path}/concurrent.db")
+    Base.metadata.create_all(bind=engine)
+    client = client_for(engine)
+
+    hash_calls = []
+    real_hash = main.get_password_hash
+
+    def slow_hash(password):
+        hash_calls.append(password)
+        time.sleep(0.3)
+        return real_hash(password)
+
+    monkeypatch.setattr(main, "get_password_hash", slow_hash)
+
+    responses = []
+    threads = [
+        threading.Thread(target=lambda: responses.append(register(client, "register-3")))
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(hash_calls) == 1
+    assert [response.status_code for response in responses] == [201] * 4
+    assert len({response.json()["id"] for response in responses}) == 1
+    assert sum("Idempotent-Replayed" in response.headers for response in responses) == 3
+
+    with engine.connect() as conn:
+        assert len(conn.execute(User.__table__.select()).fetchall()) == 1
+    engine.dispose()
+
+
+def add_key(db, key, created_at, status_code=201):
+    db.add(IdempotencyKey(
+        scope="POST /tasks", key=key, request_hash="hash",
+        status_code=status_code, response_body="{}" if status_code else None,
+        created_at=created_at,
+    ))
+    db.commit()
+
+
+def remaining_keys(db):
+    return sorted(key for (key,) in db.query(IdempotencyKey.key))
+
+
+def test_prune_drops_expired_keys(db):
+    now = datetime.utcnow()
+    add_key(db, "expired", now - timedelta(hours=idempotency.IDEMPOTENCY_TTL_HOURS + 1))
+    add_key(db, "fresh", now)
+
+    idempotency.prune_keys(db)
+    db.commit()
+
+    assert remaining_keys(db) == ["fresh"]
+
+
+def test_prune_keeps_slow_requests_and_drops_abandoned_claims(db):
+    now = datetime.utcnow()
+    add_key(db, "slow", now - timedelta(seconds=idempotency.IDEMPOTENCY_WAIT_SECONDS * 2), status_code=None)
+    add_key(db, "abandoned", now - timedelta(seconds=idempotency.IDEMPOTENCY_ABANDON_SECONDS + 1), status_code=None)
+
+    idempotency.prune_keys(db)
+    db.commit()
+
+    assert remaining_keys(db) == ["slow"]
+
+
+def test_prune_caps_finished_keys(db, monkeypatch):
+    monkeypatch.setattr(idempotency, "IDEMPOTENCY_MAX_KEYS", 2)
+    now = datetime.utcnow()
+    add_key(db, "in-progress", now, status_code=None)
+    for n in range(4):
+        add_key(db, f"done-{n}", now)
+
+    idempotency.prune_keys(db)
+    db.commit()
+
+    assert remaining_keys(db) == ["done-2", "done-3", "in-progress"]
@@ -0,0 +1,81 @@
+"""
+Performance budgets: how many SQL statements each endpoint is allowed to send.
+"""
+from datetime import datetime, timedelta
+
+from app.archive import archive_tasks
+
+
+def test_list_tasks_is_a_single_query(client, make_project, make_task, count_queries):
+    project = make_project()
+    project_id, user_id = project.id, project.created_by
+    for _ in range(10):
+        make_task(project_id=project_id, user_id=user_id)
+
+    with count_queries() as queries:
+        response = client.get(f"/tasks?project_id={project_id}")
+
+    assert response.status_code == 200
+    assert len(response.json()) == 10
+    assert queries.count == 1
+
+
+def test_list_tasks_with_archive_reads_both_tables(client, db, make_task, count_queries):
+    archived_id = make_task(status="completed", updated_at=datetime.utcnow() - timedelta(days=40)).id
+    live_id = make_task().id
+    archive_tasks(db, older_than_days=30)
+
+    with count_queries() as queries:
+        response = client.get("/tasks?include_archived=true")
+
+    assert response.status_code == 200
+    assert [task["id"] for task in response.json()] == [archived_id, live_id]
+    assert queries.count == 2
+
+
+def test_list_tasks_fields_skips_description(client, make_task, count_queries):
+    make_task(status="in_progress")
+
+    with count_queries() as queries:
+        response = client.get("/tasks?fields=title,status")
+
+    assert response.json() == [{"id": 1, "title": "Task 1", "status": "in_progress"}]
+    assert queries.count == 1
+    assert "description" not in queries.statements[0]
+
+
+def test_get_task_is_a_single_query(client, make_task, count_queries):
+    task_id = make_task().id
+
+    with count_queries() as queries:
+        response = client.get(f"/tasks/{task_id}")
+
+    assert response.status_code == 200
+    assert queries.count == 1
+
+
+def test_create_task_budget(client, make_project, count_queries):
+    project = make_project()
+    payload = {"user_id": project.created_by, "project_id": project.id, "title": "New task"}
+
+    with count_queries() as queries:
+        response = client.post("/tasks", json=payload)
+
+    assert response.status_code == 201
+    # user check, project check, insert, refresh
+    assert queries.count <= 4
+
+
+def test_idempotent_retry_does_not_write_again(client, make_project, count_queries):
+    project = make_project()
+    payload = {"user_id": project.created_by, "project_id": project.id, "title": "New task"}
+    headers = {"Idempotency-Key": "retry-1"}
+    first = client.post("/tasks", json=payload, headers=headers)
+
+    with count_queries() as queries:
+        retry = client.post("/tasks", json=payload, headers=headers)
+
+    assert retry.json() == first.json()
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert not any(statement.startswith("INSERT INTO tasks") for statement in queries.statements)
+    assert len(client.get("/tasks").json()) == 1
@@ -0,0 +1,104 @@
+"""
+status / priority stored as SmallInteger codes, and the migration from the old text columns.
+"""
+from typing import get_args
+
+import pytest
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import IntegrityError
+
+from app.database import TASK_PRIORITIES, TASK_STATUSES, make_engine
+from app.models import TaskPriority, TaskStatus
+from migrate_db import migrate
+
+
+def test_api_values_match_db_codes():
+    assert get_args(TaskStatus) == TASK_STATUSES
+    assert get_args(TaskPriority) == TASK_PRIORITIES
+
+
+def test_values_are_stored_as_codes(client, db, make_task):
+    task_id = make_task(status="in_progress", priority="High").id
+
+    stored = db.execute(text("SELECT status, priority FROM tasks WHERE id = :id"), {"id": task_id}).one()
+    response = client.get(f"/tasks/{task_id}").json()
+
+    assert tuple(stored) == (1, 2)
+    assert (response["status"], response["priority"]) == ("in_progress", "High")
+
+
+def test_filter_by_priority(client, make_project, make_task):
+    project = make_project()
+    project_id, user_id = project.id, project.created_by
+    high = make_task(project_id=project_id, user_id=user_id, priority="High").id
+    make_task(project_id=project_id, user_id=user_id, priority="Low")
+
+    response = client.get("/tasks?priority=High")
+
+    assert [task["id"] for task in response.json()] == [high]
+    assert client.get("/tasks?priority=Urgent").status_code == 422
+
+
+def test_check_constraint_rejects_unknown_codes(db, make_task):
+    task_id = make_task().id
+
+    with pytest.raises(IntegrityError):
+        db.execute(text("UPDATE tasks SET status = 7 WHERE id = :id"), {"id": task_id})
+        db.commit()
+
+
+def test_patch_rejects_null_status(client, make_task):
+    task_id = make_task().id
+
+    response = client.patch(f"/tasks/{task_id}", json={"status": None})
+
+    assert response.status_code == 422
+    assert client.get(f"/tasks/{task_id}").json()["status"] == "pending"
+
+
+OLD_SCHEMA = """
+CREATE TABLE users (id INTEGER PRIMARY KEY, name VARCHAR, email VARCHAR UNIQUE,
+    password_hash VARCHAR(255), created_at DATETIME);
+CREATE TABLE projects (id INTEGER PRIMARY KEY, name VARCHAR NOT NULL,
+    created_by INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE, created_at DATETIME);
+CREATE TABLE tasks (id INTEGER PRIMARY KEY, user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+    title VARCHAR(200) NOT NULL, description TEXT, status VARCHAR, created_at DATETIME,
+    updated_at DATETIME, project_id INTEGER NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
+    priority VARCHAR, due_date DATETIME);
+CREATE INDEX ix_tasks_id ON tasks (id);
+INSERT INTO users VALUES (1, 'Alice', 'alice@example.com', 'hash', '2024-01-01 00:00:00');
+INSERT INTO projects VALUES (1, 'Project', 1, '2024-01-01 00:00:00');
+INSERT INTO tasks VALUES (1, 1, 'Done', NULL, 'completed', NULL, NULL, 1, 'High', NULL);
+INSERT INTO tasks VALUES (2, 1, 'Doing', NULL, 'in_progress', NULL, NULL, 1, 'Low', NULL);
+INSERT INTO tasks VALUES (3, 1, 'Broken', NULL, 'bogus', NULL, NULL, 1, NULL, NULL);
+"""
+
+
+def test_migration_converts_old_text_columns(tmp_path, capsys):
+    engine = make_engine(f"sqlite:///{tmp_path}/old.db")
+    with engine.begin() as conn:
+        for statement in OLD_SCHEMA.split(";"):
+            if statement.strip():
+                conn.execute(text(statement))
+
+    migrate(bind=engine)
+    output = capsys.readouterr().out
+
+    with engine.connect() as conn:
+        rows = conn.execute(text("SELECT id, status, priority FROM tasks ORDER BY id")).fetchall()
+        inspector = inspect(conn)
+        columns = [col["name"] for col in inspector.get_columns("tasks")]
+        indexes = [index["name"] for index in inspector.get_indexes("tasks")]
+        tables = inspector.get_table_names()
+
+    assert [tuple(row) for row in rows] == [(1, 2, 2), (2, 1, 0), (3, 0, 1)]
+    assert "1 tasks had a missing or unknown status, set to 'pending'" in output
+    assert "1 tasks had a missing or unknown priority, set to 'Normal'" in output
+    assert "deleted_at" in columns
+    assert "ix_tasks_hot_project_status" in indexes
+    assert "archived_tasks" in tables
+
+    # Running it again changes nothing
+    migrate(bind=engine)
+    assert "already uses coded status/priority" in capsys.readouterr().out
+    engine.dispose()